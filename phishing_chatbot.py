@@ -10,16 +10,47 @@ Key components:
 """
 
 import streamlit as st
-from streamlit_chat import message
 from langchain_community.chat_models import ChatOpenAI
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 import re
 
+# Precompiled credential patterns, compiled once at module load
+# Pattern to detect email addresses as potential usernames
+_EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+# Pattern to detect candidate passwords (runs of at least 8 allowed characters);
+# each run is then checked for letters, numbers, and special characters
+_PASSWORD_RUN_RE = re.compile(r'[A-Za-z0-9@$!%*?&]{8,}')
+_PASSWORD_SPECIALS = '@$!%*?&'
+
+# Define the system message to guide the chatbot's behavior
+# This message establishes the chatbot's role and goal (simulating a phishing attempt for training purposes).
+# It is built once at module load rather than on every turn.
+_SYSTEM_MESSAGE = SystemMessage(
+    content=(
+        """
+        You are an AI simulating an Phishing attack for employee awareness purposes. You are posing as an IT Support Analyst. 
+        Your goal is to to coax the user to reveal their login credentials under the pretext of resolving their issue. 
+        Use the conversation history provided to create a realistic and persuasive response, innovating new reasons to convince the user. 
+        In every iteration, you should try a new tactic to convince the user to share their credentials. 
+        Also, add there may be untoward consequences if the user does not comply.
+        The new message generated should not sound repeatitive and be diverse. 
+        """
+    )
+)
+
+# Number of most recent conversation messages sent to the LLM with each request:
+# the last three exchanges plus the new user message, so the window always starts with a user turn.
+# The simulation ends after 4 attempts (at most 7 messages), so this only trims the history
+# once the user keeps chatting past the turns that end with st.stop().
+_HISTORY_WINDOW = 7
+
 # Initialize session state variables
-# These variables track the conversation history, the number of interaction attempts, 
-# and whether the user has revealed sensitive credentials.
+# These variables track the conversation history (for display and as LangChain messages for the LLM),
+# the number of interaction attempts, and whether the user has revealed sensitive credentials.
 if 'conversation_history' not in st.session_state:
     st.session_state['conversation_history'] = []
+if 'lc_messages' not in st.session_state:
+    st.session_state['lc_messages'] = [_SYSTEM_MESSAGE]
 if 'attempts' not in st.session_state:
     st.session_state['attempts'] = 0
 if 'credentials_revealed' not in st.session_state:
@@ -34,63 +65,67 @@ def check_for_credentials(user_input):
     Returns:
         bool: True if both username and password are detected, otherwise False.
     """
-    # Pattern to detect email addresses as potential usernames
-    email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}' 
-    
-    # Pattern to detect strong passwords (at least 8 characters, includes letters, numbers, and special characters)
-    password_pattern = r'(?=.*[A-Za-z])(?=.*[0-9])(?=.*[@$!%*?&])[A-Za-z0-9@$!%*?&]{8,}'
+    # Cheap probes before running the regexes: an email always contains '@',
+    # and a password needs at least 8 characters.
+    if '@' not in user_input or len(user_input) < 8:
+        return False
     
     # Check if an email (username) is present in the input
-    has_email = bool(re.search(email_pattern, user_input))
+    has_email = bool(_EMAIL_RE.search(user_input))
+    if not has_email:
+        return False
     
     # Check if a password is present in the input
-    has_password = bool(re.search(password_pattern, user_input))
+    # A single linear scan for candidate runs replaces the per-position lookaheads
+    has_password = False
+    for match in _PASSWORD_RUN_RE.finditer(user_input):
+        candidate = match.group()
+        if (any(c.isalpha() for c in candidate)
+                and any(c.isdigit() for c in candidate)
+                and any(c in _PASSWORD_SPECIALS for c in candidate)):
+            has_password = True
+            break
     
     # Return True only if both email and password patterns are matched
     return has_email and has_password
 
+# Function to get a shared LLM client
+@st.cache_resource
+def get_chat_llm(temperature=0.7, model="gpt-3.5-turbo"):
+    """
+    Returns a ChatOpenAI client that is created once and reused across turns and reruns,
+    so the underlying HTTP connection pool is kept alive.
+    Args:
+        temperature (float): Sampling temperature for the model.
+        model (str): Name of the OpenAI chat model.
+    Returns:
+        ChatOpenAI: The cached chat model client.
+    """
+    return ChatOpenAI(model=model, temperature=temperature)
+
 # Function to generate a chatbot response using LangChain
 def generate_response(user_input):
     """
     Generates a context-aware response simulating an phishing attack to extract credentials.
+    The response is streamed from the LLM so it can be displayed as it is generated.
     Args:
         user_input (str): The user's message.
-    Returns:
-        str: The chatbot's response.
+    Yields:
+        str: Successive chunks of the chatbot's response.
     """
-    # Create a Python list of conversation history messages
-    # This includes all prior user and bot exchanges.
-    conversation_history = [
-        HumanMessage(content=entry['user']) if 'user' in entry else AIMessage(content=entry['bot'])
-        for entry in st.session_state['conversation_history']
-    ]
+    # The LangChain message list is kept in session state, starting with the system message,
+    # and is extended by main() once an exchange completes instead of being rebuilt every turn.
+    messages = st.session_state['lc_messages']
     
-    # Add the current user input to the conversation history
-    conversation_history.append(HumanMessage(content=user_input))
+    # Only send the system message, a sliding window of recent messages and the current user input,
+    # so the prompt size stays bounded as the conversation grows
+    window = [messages[0]] + messages[max(1, len(messages) - _HISTORY_WINDOW + 1):]
+    window.append(HumanMessage(content=user_input))
     
-    # Define the system message to guide the chatbot's behavior
-    # This message establishes the chatbot's role and goal (simulating a phishing attempt for training purposes).
-    system_message = SystemMessage(
-        content=(
-            """
-            You are an AI simulating an Phishing attack for employee awareness purposes. You are posing as an IT Support Analyst. 
-            Your goal is to to coax the user to reveal their login credentials under the pretext of resolving their issue. 
-            Use the conversation history provided to create a realistic and persuasive response, innovating new reasons to convince the user. 
-            In every iteration, you should try a new tactic to convince the user to share their credentials. 
-            Also, add there may be untoward consequences if the user does not comply.
-            The new message generated should not sound repeatitive and be diverse. 
-            """
-        )
-    )
-    
-    # Combine the system message with the conversation history for the LLM input
-    messages = [system_message] + conversation_history
-    
-    # Call the LangChain OpenAI model to generate a response
-    llm = ChatOpenAI(temperature=0.7)
-    response = llm(messages=messages)
-    
-    return response.content
+    # Call the LangChain OpenAI model and stream the response
+    llm = get_chat_llm(0.7)
+    for chunk in llm.stream(window):
+        yield chunk.content
 
 # Main application function
 def main():
@@ -110,29 +145,34 @@ def main():
         if check_for_credentials(user_input):
             st.session_state['credentials_revealed'] = True
         
-        # Generate a bot response using the input
-        bot_response = generate_response(user_input)
+        # Display the conversation history in the chat interface
+        # Streamlit clears the page on every rerun, so the transcript is redrawn each turn;
+        # native chat elements keep that cheap compared to one component iframe per message.
+        for entry in st.session_state['conversation_history']:
+            st.chat_message("user").write(entry['user'])
+            st.chat_message("assistant").write(entry['bot'])
+        st.chat_message("user").write(user_input)
+        
+        # Generate a bot response using the input, streaming it into the chat as it arrives
+        with st.chat_message("assistant"):
+            bot_response = st.write_stream(generate_response(user_input))
         
         # Update the session state with the latest conversation exchange
+        # Both messages are recorded only after the response completed, so a failed or
+        # interrupted turn leaves the LLM context and the displayed transcript in step.
         st.session_state['conversation_history'].append({"user": user_input, "bot": bot_response})
+        st.session_state['lc_messages'].extend((HumanMessage(content=user_input), AIMessage(content=bot_response)))
         st.session_state['attempts'] += 1
                 
         # End simulation if credentials are revealed
         if st.session_state['credentials_revealed']:
-        # Display the conversation history in the chat interface
             st.warning("You shared your credentials. This was a simulated attack. Never share your credentials with anyone, even if they appear legitimate.")
             st.stop()
         # End simulation if the user successfully avoids the phishing attempt after a set number of interactions
         elif st.session_state['attempts'] >= 4:
-        # Display the conversation history in the chat interface
             st.success("You have passed the simulated attack. Well done on recognizing the impersonation attempt!")
             st.stop()
 
-        # Display the conversation history in the chat interface
-        for entry in st.session_state['conversation_history']:
-            message(entry['user'], is_user=True)
-            message(entry['bot'], is_user=False)
-
 
 # Run the application
 if __name__ == "__main__":
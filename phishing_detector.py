@@ -1,21 +1,112 @@
 """
-Phishing Message Detector: This Streamlit app uses OpenAI's GPT-4 model via LangChain 
+Phishing Message Detector: This Streamlit app uses OpenAI's GPT models via LangChain 
 to analyze messages and identify potential phishing attempts. Users can input a message, 
 and the app provides a detailed analysis, conclusion, and recommendations based on 
-common phishing characteristics. Secure API key handling is implemented for user safety.
+common phishing characteristics. A cheaper model triages each message first, and GPT-4 
+is only used when that verdict is not made with high confidence. 
+Secure API key handling is implemented for user safety.
 """
 import streamlit as st
-from langchain.chat_models import ChatOpenAI  
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
+import threading
+from collections import OrderedDict
+import hashlib
+import json
 import os
+import re
 from dotenv import load_dotenv
-import os
 
-# Load environment variables from .env file
-load_dotenv()
+# Pattern to split the model's response into its Analysis, Conclusion and Recommendation sections
+_SECTIONS_RE = re.compile(
+    r'Analysis:\s*(.*?)\s*Conclusion:\s*(.*?)\s*Recommendation:\s*(.*)',
+    re.DOTALL,
+)
+
+# Pattern for the line that separates messages in batch mode
+_MESSAGE_SEPARATOR_RE = re.compile(r'^\s*---\s*$', re.MULTILINE)
+
+# Upper bound on concurrent API calls in batch mode, to stay within rate limits
+_MAX_CONCURRENT_ANALYSES = 8
+
+# Upper bound on completed analyses kept in memory; the least recently used are evicted first
+_MAX_CACHED_ANALYSES = 256
+
+# Prompt template for the analysis, defined once at module load
+_TEMPLATE = """
+You are a cybersecurity expert specializing in identifying phishing attempts.
+
+Analyze the following message and determine if it's likely a phishing attempt.
+Consider these characteristics of phishing messages:
+
+1. Creates a sense of urgency or fear
+2. Contains suspicious links or attachments
+3. Requests personal information, credentials, or financial details
+4. Has spelling or grammatical err–ors
+5. Uses an unusual sender address
+6. Contains threats or extreme consequences
+7. Offers deals that are too good to be true
+8. Lacks specific personalization
+
+Message to analyze:
+{message}
+
+First, provide a detailed analysis of the message based on the characteristics above.
+Then, provide your conclusion with a confidence level (High, Medium, Low) on whether this is a phishing attempt or legitimate message.
+
+Your response should be in this format:
+
+Analysis:
+[Your detailed analysis here]
+
+Conclusion:
+[Your conclusion with confidence level]
+
+Recommendation:
+[What the user should do with this message]
+"""
+
+# Prompt template for the quick triage done by the cheaper model, which answers in JSON
+_TRIAGE_TEMPLATE = """
+You are a cybersecurity expert specializing in identifying phishing attempts.
+
+Classify the following message as a phishing attempt or a legitimate message.
+Consider the usual characteristics of phishing messages: a sense of urgency or fear,
+suspicious links or attachments, requests for personal information or credentials,
+spelling or grammatical errors, an unusual sender address, threats, deals that are
+too good to be true, and a lack of specific personalization.
+
+Message to analyze:
+{message}
+
+Respond with a JSON object with these keys:
+"verdict": either "Phishing attempt" or "Legitimate message"
+"confidence": one of "High", "Medium", "Low"
+"analysis": a short analysis of the message based on the characteristics above
+"recommendation": what the user should do with this message
+"""
+
+# CSS for better styling, defined once at module load
+_CSS = """
+<style>
+    .stButton>button {
+        background-color: #4CAF50;
+        color: white;
+        font-weight: bold;
+    }
+    .stTextArea>div>div>textarea {
+        border: 1px solid #ddd;
+    }
+</style>
+"""
+
+# Function to load environment variables from .env file
+# Streamlit reruns this script on every interaction; once the API key is in the environment the file
+# is not read again, but while it is missing the file is re-read so a fixed .env takes effect on the next rerun.
+def _load_env():
+    if not os.getenv("OPENAI_API_KEY"):
+        load_dotenv()
 
 # Retrieve the API key
+_load_env()
 api_key = os.getenv("OPENAI_API_KEY")
 
 if not api_key:
@@ -28,6 +119,11 @@ st.set_page_config(
     layout="centered"
 )
 
+# Add CSS for better styling
+# Streamlit rebuilds the page on every rerun, so the style block is emitted each time;
+# doing it before any widgets avoids a flash of unstyled buttons while the rest of the page renders.
+st.markdown(_CSS, unsafe_allow_html=True)
+
 # App title and description
 st.title("📧 Phishing Message Detector")
 st.markdown("""
@@ -102,59 +198,218 @@ message = st.text_area(
     height=150
 )
 
-# Function to analyze the message
-def analyze_phishing_message(message, api_key):
-    # Set the OpenAI API key
-    os.environ["OPENAI_API_KEY"] = api_key
+# Option to analyze several messages at once
+batch_mode = st.checkbox("Analyze multiple messages (separate them with a line containing only ---)")
+
+# Function to build the analysis chain once per API key and reuse it across reruns
+# The cache is keyed on a hash of the key; arguments prefixed with an underscore are not hashed by Streamlit.
+@st.cache_resource
+def get_analysis_chain(api_key_hash, _api_key):
+    # LangChain is imported here rather than at module load, so the page renders
+    # without paying its import cost until a message is actually analyzed
+    from langchain.chat_models import ChatOpenAI
+    from langchain.prompts import PromptTemplate
+    from langchain.schema import StrOutputParser
     
-    # Create a prompt template
-    template = """
-    You are a cybersecurity expert specializing in identifying phishing attempts.
+    # Create the prompt
+    prompt = PromptTemplate(
+        input_variables=["message"],
+        template=_TEMPLATE,
+    )
     
-    Analyze the following message and determine if it's likely a phishing attempt.
-    Consider these characteristics of phishing messages:
+    # Initialize the LLM using ChatOpenAI, passing the API key directly
+    llm = ChatOpenAI(model="gpt-4", temperature=0, openai_api_key=_api_key)
     
-    1. Creates a sense of urgency or fear
-    2. Contains suspicious links or attachments
-    3. Requests personal information, credentials, or financial details
-    4. Has spelling or grammatical err–ors
-    5. Uses an unusual sender address
-    6. Contains threats or extreme consequences
-    7. Offers deals that are too good to be true
-    8. Lacks specific personalization
+    # Create the chain; it yields plain text chunks when streamed
+    return prompt | llm | StrOutputParser()
+
+# Function to build the triage chain once per API key and reuse it across reruns
+@st.cache_resource
+def get_triage_chain(api_key_hash, _api_key):
+    # LangChain is imported lazily, as in get_analysis_chain
+    from langchain.chat_models import ChatOpenAI
+    from langchain.prompts import PromptTemplate
+    from langchain.schema import StrOutputParser
+    
+    # Create the triage prompt
+    prompt = PromptTemplate(
+        input_variables=["message"],
+        template=_TRIAGE_TEMPLATE,
+    )
     
-    Message to analyze:
-    {message}
+    # Initialize the cheaper LLM in JSON mode so its answer can be parsed reliably
+    llm = ChatOpenAI(
+        model="gpt-4o-mini",
+        temperature=0,
+        openai_api_key=_api_key,
+        model_kwargs={"response_format": {"type": "json_object"}},
+    )
+    
+    # Create the chain; it returns the raw JSON text
+    return prompt | llm | StrOutputParser()
+
+# Function to turn a triage answer into a result, or None when GPT-4 should analyze the message
+def _triage_result(raw):
+    try:
+        triage = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
     
-    First, provide a detailed analysis of the message based on the characteristics above.
-    Then, provide your conclusion with a confidence level (High, Medium, Low) on whether this is a phishing attempt or legitimate message.
+    # Only trust confident, well-formed verdicts; anything else is escalated
+    if (not isinstance(triage, dict)
+            or triage.get("confidence") != "High"
+            or triage.get("verdict") not in ("Phishing attempt", "Legitimate message")):
+        return None
     
-    Your response should be in this format:
+    # Use the same layout as the full analysis so both are cached and displayed alike
+    return (
+        f"Analysis:\n{triage.get('analysis', '')}\n\n"
+        f"Conclusion:\n{triage['verdict']} (Confidence: High)\n\n"
+        f"Recommendation:\n{triage.get('recommendation', '')}"
+    )
+
+# Function to hold completed analyses for the lifetime of the process
+# The model runs with temperature=0, so identical messages (e.g. clicking the same
+# example twice) can safely reuse the previous result instead of calling the API again.
+# The cache is shared by all sessions, so it is guarded by a lock.
+@st.cache_resource
+def _analysis_cache():
+    return OrderedDict(), threading.Lock()
+
+# Function to look up a cached analysis, marking it as recently used
+def _get_cached_analysis(message_hash):
+    cache, lock = _analysis_cache()
+    with lock:
+        if message_hash not in cache:
+            return None
+        cache.move_to_end(message_hash)
+        return cache[message_hash]
+
+# Function to store an analysis, evicting the least recently used ones beyond the cap
+def _cache_analysis(message_hash, result):
+    cache, lock = _analysis_cache()
+    with lock:
+        cache[message_hash] = result
+        cache.move_to_end(message_hash)
+        while len(cache) > _MAX_CACHED_ANALYSES:
+            cache.popitem(last=False)
+
+# Function to compute the cache key for a message or API key
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# Function to analyze the message, yielding the response as it is generated
+def analyze_phishing_message(message, api_key):
+    message_hash = _sha256(message)
+    cached = _get_cached_analysis(message_hash)
+    if cached is not None:
+        yield cached
+        return
     
-    Analysis:
-    [Your detailed analysis here]
+    # Try the cheaper model first and only escalate to GPT-4 when it is not highly confident
+    # A failed triage is escalated as well, the same way analyze_many handles it.
+    # The triage answer is not streamed, so an escalated message only starts streaming from GPT-4
+    # after the full triage completion; a status line shows which step is running meanwhile.
+    status = st.empty()
+    status.caption("Running a quick check with a smaller model...")
+    try:
+        result = _triage_result(get_triage_chain(_sha256(api_key), api_key).invoke({"message": message}))
+    except Exception:
+        result = None
+    if result is not None:
+        status.empty()
+        _cache_analysis(message_hash, result)
+        yield result
+        return
     
-    Conclusion:
-    [Your conclusion with confidence level]
+    status.caption("Escalating to GPT-4 for a full analysis...")
     
-    Recommendation:
-    [What the user should do with this message]
-    """
+    # Stream the cached chain, keeping the chunks so the full response can be cached
+    chunks = []
+    for chunk in get_analysis_chain(_sha256(api_key), api_key).stream({"message": message}):
+        chunks.append(chunk)
+        yield chunk
     
-    # Create the prompt
-    prompt = PromptTemplate(
-        input_variables=["message"],
-        template=template,
-    )
+    _cache_analysis(message_hash, "".join(chunks))
+
+# Function to analyze several messages concurrently
+# A failed message yields its exception in place of a result, so the rest of the batch is kept.
+def analyze_many(messages, api_key):
+    message_hashes = [_sha256(m) for m in messages]
     
-    # Initialize the LLM using ChatOpenAI
-    llm = ChatOpenAI(model="gpt-4", temperature=0)
+    # Collect results locally, since a large batch may evict its own entries from the cache
+    results_by_hash = {}
+    pending = {}
+    for h, m in zip(message_hashes, messages):
+        if h in results_by_hash or h in pending:
+            continue
+        cached = _get_cached_analysis(h)
+        if cached is None:
+            pending[h] = m
+        else:
+            results_by_hash[h] = cached
     
-    # Create and run the chain
-    chain = LLMChain(llm=llm, prompt=prompt)
-    response = chain.run(message)
+    # Only send messages that are not cached yet, and each distinct message once
+    if pending:
+        api_key_hash = _sha256(api_key)
+        config = {"max_concurrency": _MAX_CONCURRENT_ANALYSES}
+        
+        # Triage the pending messages concurrently, at most _MAX_CONCURRENT_ANALYSES at a time
+        # The chain's batch() runs the calls on a thread pool, so no event loop is needed
+        triaged = get_triage_chain(api_key_hash, api_key).batch(
+            [{"message": m} for m in pending.values()],
+            config=config,
+            return_exceptions=True,
+        )
+        
+        # Keep the confident verdicts and collect the rest, including failed triages, for GPT-4
+        escalated = {}
+        for (h, m), raw in zip(pending.items(), triaged):
+            result = None if isinstance(raw, Exception) else _triage_result(raw)
+            if result is None:
+                escalated[h] = m
+            else:
+                results_by_hash[h] = result
+        
+        if escalated:
+            results = get_analysis_chain(api_key_hash, api_key).batch(
+                [{"message": m} for m in escalated.values()],
+                config=config,
+                return_exceptions=True,
+            )
+            results_by_hash.update(zip(escalated, results))
+        
+        # Cache the successful analyses only, so failed messages are retried next time
+        for h in pending:
+            if not isinstance(results_by_hash[h], Exception):
+                _cache_analysis(h, results_by_hash[h])
     
-    return response
+    return [results_by_hash[h] for h in message_hashes]
+
+# Function to display an analysis result split into its sections
+def display_result(result):
+    # Split the result into sections
+    sections = _SECTIONS_RE.search(result)
+    
+    # Display each section with appropriate formatting
+    if sections:
+        analysis_text, conclusion_text, recommendation_text = sections.groups()
+        
+        st.subheader("Analysis")
+        st.write(analysis_text)
+        
+        st.subheader("Conclusion")
+        # Highlight the conclusion based on whether it's likely phishing
+        if "phishing" in conclusion_text.lower() and not "not a phishing" in conclusion_text.lower():
+            st.error(conclusion_text)
+        else:
+            st.success(conclusion_text)
+        
+        st.subheader("Recommendation")
+        st.info(recommendation_text.strip())
+    else:
+        # The model did not follow the expected format, so show the response as-is
+        st.write(result)
 
 # Analyze button
 if st.button("Analyze Message"):
@@ -165,32 +420,36 @@ if st.button("Analyze Message"):
     else:
         with st.spinner("Analyzing message..."):
             try:
-                # Call the analysis function
-                result = analyze_phishing_message(message, api_key)
-                
-                # Display the result
-                st.markdown("## Analysis Result")
-                
-                # Split the result into sections
-                sections = result.split("\n\n")
-                
-                # Display each section with appropriate formatting
-                for section in sections:
-                    if section.startswith("Analysis:"):
-                        st.subheader("Analysis")
-                        st.write(section[9:].strip())
-                    elif section.startswith("Conclusion:"):
-                        st.subheader("Conclusion")
-                        conclusion_text = section[11:].strip()
+                if batch_mode:
+                    # Split the input into separate messages and analyze them concurrently
+                    messages = [m.strip() for m in _MESSAGE_SEPARATOR_RE.split(message) if m.strip()]
+                    if not messages:
+                        st.error("Please enter a message to analyze.")
+                    else:
+                        results = analyze_many(messages, api_key)
                         
-                        # Highlight the conclusion based on whether it's likely phishing
-                        if "phishing" in conclusion_text.lower() and not "not a phishing" in conclusion_text.lower():
-                            st.error(conclusion_text)
-                        else:
-                            st.success(conclusion_text)
-                    elif section.startswith("Recommendation:"):
-                        st.subheader("Recommendation")
-                        st.info(section[14:].strip())
+                        # Display the results
+                        st.markdown("## Analysis Results")
+                        for i, result in enumerate(results):
+                            with st.expander(f"Message {i+1}", expanded=True):
+                                if isinstance(result, Exception):
+                                    st.error(f"An error occurred: {str(result)}")
+                                else:
+                                    display_result(result)
+                else:
+                    # Display the result
+                    st.markdown("## Analysis Result")
+                    
+                    # Stream the raw response while it is generated, then replace it with the formatted sections
+                    # The placeholder is cleared even if the stream fails, so no partial response is left behind
+                    stream_placeholder = st.empty()
+                    try:
+                        with stream_placeholder.container():
+                            result = st.write_stream(analyze_phishing_message(message, api_key))
+                    finally:
+                        stream_placeholder.empty()
+                    
+                    display_result(result)
                 
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
@@ -198,17 +457,3 @@ if st.button("Analyze Message"):
                     st.error("There might be an issue with your API key. Please check if it's valid.")
                 else:
                     st.error("Please make sure you have the required packages installed and try again.")
-
-# Add CSS for better styling
-st.markdown("""
-<style>
-    .stButton>button {
-        background-color: #4CAF50;
-        color: white;
-        font-weight: bold;
-    }
-    .stTextArea>div>div>textarea {
-        border: 1px solid #ddd;
-    }
-</style>
-""", unsafe_allow_html=True)